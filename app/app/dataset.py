@@ -1,6 +1,7 @@
 import numpy as np
 import typing as t
 from torch.utils.data import Dataset as _Dataset
+from torch.utils.data.dataloader import default_collate
 from skimage import io, transform, color, util
 from .entities import Annotations, Annotation
 
@@ -43,8 +44,15 @@ class Dataset(_Dataset):
     def __getitem__(self, idx: int) -> t.Tuple[t.Any, t.Any, Annotation]:
         row = self.annotations[idx]
 
-        label = np.zeros(3474)
-        for i in row["label_ids"]:
-            label[i] = 1
+        label = np.zeros(3474, dtype=np.float32)
+        label[row["label_ids"]] = 1
         img = self.__get_img(f"{self.image_dir}/{row['id']}.png")
         return img, label, row
+
+
+def collate_fn(
+    batch: t.List[t.Tuple[t.Any, t.Any, Annotation]]
+) -> t.Tuple[t.Any, t.Any, Annotations]:
+    """label_ids are ragged, so annotations are kept as a list"""
+    imgs, labels, rows = zip(*batch)
+    return default_collate(imgs), default_collate(labels), list(rows)
@@ -1,4 +1,5 @@
 import typing as t
+import numpy as np
 
 
 class Label(t.TypedDict):
@@ -12,7 +13,7 @@ Labels = t.Dict[int, Label]
 
 class Annotation(t.TypedDict):
     id: str
-    label_ids: t.Sequence[int]
+    label_ids: t.Union[t.Sequence[int], np.ndarray]
 
 
 Annotations = t.List[Annotation]
@@ -1,18 +1,30 @@
 import numpy as np
 import typing as t
+import copy
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+from torch import Tensor
 from collections import OrderedDict
 
 
+@torch.jit.script
+def _residual_relu(x: Tensor, s: Tensor) -> Tensor:
+    return torch.relu_(x + s)
+
+
 class SSEModule(nn.Module):
     def __init__(self, in_channels: int) -> None:
         super().__init__()
         self.se = nn.Sequential(nn.Conv2d(in_channels, 1, 1), nn.Sigmoid())
 
+    def gate(self, x):  # type: ignore
+        # (B, 1, H, W)
+        return self.se(x)
+
     def forward(self, x):  # type: ignore
-        x = x * self.se(x)
+        x = x * self.gate(x)
         return x
 
 
@@ -20,15 +32,18 @@ class CSEModule(nn.Module):
     def __init__(self, in_channels: int, reduction: int) -> None:
         super().__init__()
         self.se = nn.Sequential(
-            nn.AdaptiveAvgPool2d(1),
-            nn.Conv2d(in_channels, in_channels // reduction, 1),
+            nn.Linear(in_channels, in_channels // reduction),
             nn.ReLU(inplace=True),
-            nn.Conv2d(in_channels // reduction, in_channels, 1),
+            nn.Linear(in_channels // reduction, in_channels),
             nn.Sigmoid(),
         )
 
+    def gate(self, x):  # type: ignore
+        # (B, C, 1, 1)
+        return self.se(x.mean(dim=(2, 3))).unsqueeze(-1).unsqueeze(-1)
+
     def forward(self, x):  # type: ignore
-        x = x * self.se(x)
+        x = x * self.gate(x)
         return x
 
 class SCSEModule(nn.Module):
@@ -38,7 +53,8 @@ class SCSEModule(nn.Module):
         self.s_se = SSEModule(in_channels)
 
     def forward(self, x):  # type: ignore
-        return self.c_se(x) + self.s_se(x)
+        # x * c + x * s == x * (c + s)
+        return x * (self.c_se.gate(x) + self.s_se.gate(x))
 
 
 class SENextBottleneck(nn.Module):
@@ -53,11 +69,16 @@ class SENextBottleneck(nn.Module):
         reduction: int = 16,
         pool: t.Literal["max", "avg"] = "max",
         is_shortcut: bool = False,
+        split_groups: bool = False,
     ) -> None:
         super().__init__()
         mid_channels = groups * (out_channels // 2 // groups)
         self.conv1 = ConvBR2d(in_channels, mid_channels, 1, 0, 1,)
-        self.conv2 = ConvBR2d(mid_channels, mid_channels, 3, 1, 1, groups=groups)
+        self.conv2: nn.Module
+        if split_groups and groups > 1:
+            self.conv2 = SplitConvBR2d(mid_channels, mid_channels, 3, 1, 1, groups=groups)
+        else:
+            self.conv2 = ConvBR2d(mid_channels, mid_channels, 3, 1, 1, groups=groups)
         self.conv3 = ConvBR2d(mid_channels, out_channels, 1, 0, 1, is_activation=False)
         self.se = CSEModule(out_channels, reduction)
         self.stride = stride
@@ -86,12 +107,7 @@ class SENextBottleneck(nn.Module):
                 x = F.avg_pool2d(x, self.stride, self.stride)  # avg
             x = self.shortcut(x)
 
-        print(x.shape)
-        print(s.shape)
-        x = x + s
-        x = F.relu(x, inplace=True)
-
-        return x
+        return _residual_relu(x, s)
 
 
 class ConvBR2d(nn.Module):
@@ -129,6 +145,63 @@ class ConvBR2d(nn.Module):
             x = self.relu(x)
         return x
 
+    def fuse(self) -> None:
+        """fold bn into conv weights. eval mode only"""
+        if isinstance(self.bn, nn.Identity):
+            return
+        self.conv = fuse_conv_bn_eval(self.conv, self.bn)
+        self.bn = nn.Identity()
+
+
+def fuse(model: nn.Module) -> nn.Module:
+    for m in model.modules():
+        if isinstance(m, ConvBR2d):
+            m.fuse()
+    return model
+
+
+def freeze(model: nn.Module, example: Tensor) -> t.Any:
+    """fused and frozen TorchScript copy of model for inference"""
+    model = fuse(copy.deepcopy(model).eval())
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+    return torch.jit.freeze(traced)
+
+
+class SplitConvBR2d(nn.Module):
+    """grouped ConvBR2d computed as one plain ConvBR2d per group"""
+
+    def __init__(
+        self,
+        in_channels: int,
+        out_channels: int,
+        kernel_size: int = 1,
+        padding: int = 0,
+        dilation: int = 1,
+        stride: int = 1,
+        groups: int = 1,
+        is_activation: bool = True,
+    ) -> None:
+        super().__init__()
+        self.groups = groups
+        self.convs = nn.ModuleList(
+            [
+                ConvBR2d(
+                    in_channels // groups,
+                    out_channels // groups,
+                    kernel_size=kernel_size,
+                    padding=padding,
+                    dilation=dilation,
+                    stride=stride,
+                    is_activation=is_activation,
+                )
+                for _ in range(groups)
+            ]
+        )
+
+    def forward(self, x):  # type: ignore
+        xs = x.chunk(self.groups, dim=1)
+        return torch.cat([c(xi) for c, xi in zip(self.convs, xs)], dim=1)
 
 
 class DoubleConv(nn.Module):
@@ -150,7 +223,15 @@ class DoubleConv(nn.Module):
 
 
 class SEResNeXt(nn.Module):
-    def __init__(self, in_channels: int, out_channels: int, depth: int, width: int) -> None:
+    def __init__(
+        self,
+        in_channels: int,
+        out_channels: int,
+        depth: int,
+        width: int,
+        stride: int = 1,
+        split_groups: bool = False,
+    ) -> None:
         super(SEResNeXt, self).__init__()
         # 3 -> width
         self.in_conv = ConvBR2d(in_channels, width, is_activation=False)
@@ -161,17 +242,17 @@ class SEResNeXt(nn.Module):
             f"layer-{i}":SENextBottleneck(
                 in_channels=width+diff*(i)//depth,
                 out_channels=width + diff*(i + 1)//depth,
-                groups= width // depth
+                groups= width // depth,
+                stride=stride,
+                is_shortcut=diff > 0 or stride > 1,
+                split_groups=split_groups,
             )
             for i in range(depth)
         }))
 
     def forward(self, x):  # type: ignore
-        print(x.shape)
         x = self.in_conv(x)
-        print(x.shape)
         x = self.layer(x)
-        print(x.shape)
         return x
 
 
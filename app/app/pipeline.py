@@ -14,7 +14,7 @@ from .dataset import Dataset
 from sklearn.model_selection import TimeSeriesSplit
 from .preprocess import (
     load_labels,
-    get_annotations,
+    get_annotations_cached,
     get_summary,
     get_images_summary,
     kfold,
@@ -29,8 +29,8 @@ cache = Cache("/store/tmp")
 def eda() -> t.Any:
     labels = cache("labels", load_labels)("/store/dataset/labels.csv")
     print(f"{len(labels)=}")
-    train_annotations = cache("train_annotations", get_annotations)(
-        "/store/dataset/train.csv", labels
+    train_annotations = get_annotations_cached(
+        "/store/dataset/train.csv", "/store/tmp/train_annotations.parquet"
     )
     train_summary = cache("train_summary", get_summary)(train_annotations, labels)
     print(f"{train_summary=}")
@@ -45,11 +45,16 @@ def eda() -> t.Any:
 
 
 def train() -> t.Any:
-    labels = cache("labels", load_labels)("/store/dataset/labels.csv")
-    train_annotations = cache("train_annotations", get_annotations)(
-        "/store/dataset/train.csv", labels
+    train_annotations = get_annotations_cached(
+        "/store/dataset/train.csv", "/store/tmp/train_annotations.parquet"
     )
-    kfolded = cache("kfolded", kfold)(4, train_annotations)
-    for i, (train_data, test_data) in enumerate(kfolded):
-        t = Trainer(train_data, test_data, f"/store/model-{i}",)
+    kfolded = cache("kfold_indices", kfold)(4, train_annotations)
+    for i, (train_idx, test_idx) in enumerate(kfolded):
+        train_data = [train_annotations[j] for j in train_idx]
+        test_data = [train_annotations[j] for j in test_idx]
+        t = Trainer(
+            train_data=train_data,
+            test_data=test_data,
+            model_path=f"/store/model-{i}",
+        )
         t.train(1000)
@@ -2,36 +2,35 @@ import numpy as np
 import typing as t
 import pandas as pd
 import os
+import itertools
 from concurrent.futures import ProcessPoolExecutor
-from skimage import io
+from PIL import Image
 import glob
 from tqdm import tqdm
-from sklearn.metrics import fbeta_score
 from iterstrat.ml_stratifiers import MultilabelStratifiedKFold
 from .entities import Label, Labels, Annotations
 from .dataset import Dataset
-from cytoolz.curried import unique, pipe, map, mapcat, frequencies, topk
 import seaborn as sns
 
 sns.set()
 
 
-def load_labels(path: str) -> Labels:
+def read_attributes(path: str) -> t.Dict[int, Label]:
     df = pd.read_csv(path)
-    rows: Labels = dict()
-    for (idx, value) in df.iterrows():
-        c, d = encode_attribute(value["attribute_name"])
-        rows[idx] = {"id": idx, "category": c, "detail": d}
+    df[["category", "detail"]] = df["attribute_name"].str.split(
+        "::", n=1, expand=True
+    )
+    df["id"] = df.index
+    rows: t.Dict[int, Label] = df[["id", "category", "detail"]].to_dict("index")
     return rows
 
 
+def load_labels(path: str) -> Labels:
+    return read_attributes(path)
+
+
 def load_images(path: str, labels: Labels) -> t.Any:
-    df = pd.read_csv(path)
-    rows: t.Dict[int, Label] = dict()
-    for (idx, value) in df.iterrows():
-        c, d = encode_attribute(value["attribute_name"])
-        rows[idx] = {"id": idx, "category": c, "detail": d}
-    return rows
+    return read_attributes(path)
 
 
 def encode_attribute(name: str) -> t.Tuple[str, str]:
@@ -39,73 +38,115 @@ def encode_attribute(name: str) -> t.Tuple[str, str]:
     return splited[0], splited[1]
 
 
-def get_annotations(path: str, labels: Labels) -> Annotations:
+def read_annotations(path: str) -> pd.DataFrame:
     df = pd.read_csv(path)
-    df["attribute_ids"] = df["attribute_ids"].apply(
-        lambda x: [int(i) for i in x.split(" ")]
+    df["label_ids"] = (
+        df["attribute_ids"].str.split(" ").map(lambda x: np.array(x, dtype=np.int32))
     )
-    annotations: Annotations = []
-    for _, vs in df.iterrows():
-        annotations.append(
-            {"id": vs["id"], "label_ids": vs["attribute_ids"],}
-        )
+    return df[["id", "label_ids"]]
+
+
+def get_annotations(path: str, labels: Labels) -> Annotations:
+    annotations: Annotations = read_annotations(path).to_dict("records")
     return annotations
 
 
+def get_annotations_cached(path: str, cache_path: str) -> Annotations:
+    """get_annotations backed by a parquet file, rebuilt when the csv is newer"""
+    if os.path.exists(cache_path) and os.path.getmtime(
+        cache_path
+    ) >= os.path.getmtime(path):
+        df = pd.read_parquet(cache_path)
+    else:
+        df = read_annotations(path)
+        df.to_parquet(cache_path)
+    annotations: Annotations = df.to_dict("records")
+    return annotations
+
+
+# modes that decode to 2d arrays; everything else (LA, RGB, RGBA, ...) is 3d
+GRAY_MODES = ("1", "L", "I", "I;16", "I;16B", "F")
+
+
+def read_image_header(path: str) -> t.Tuple[int, int, bool]:
+    with Image.open(path) as im:
+        w, h = im.size
+        if im.mode == "P":
+            # palette images decode to gray only if every entry is gray
+            palette = np.frombuffer(im.palette.palette, dtype=np.uint8)
+            rgb = palette[: len(palette) // 3 * 3].reshape(-1, 3)
+            is_rgb = bool((rgb != rgb[:, :1]).any())
+        else:
+            is_rgb = im.mode not in GRAY_MODES
+        return h, w, is_rgb
+
+
 def get_images_summary(image_dir: str) -> t.Dict:
     paths = glob.glob(os.path.join(image_dir, "*.png"))
+    gray_count = 0
+    rgb_count = 0
+    min_w, max_w, sum_w = np.inf, -np.inf, 0.0
+    min_h, max_h, sum_h = np.inf, -np.inf, 0.0
+    min_a, max_a, sum_a = np.inf, -np.inf, 0.0
     with ProcessPoolExecutor(max_workers=os.cpu_count()) as e:
-        shapes = np.zeros((len(paths), 2))
-        gray_count = 0
-        rgb_count = 0
-        for i, (p, img) in tqdm(enumerate(zip(paths, e.map(io.imread, paths)))):
-            if len(img.shape) == 3:
+        headers = e.map(read_image_header, paths, chunksize=128)
+        for h, w, is_rgb in tqdm(headers, total=len(paths)):
+            if is_rgb:
                 rgb_count += 1
             else:
                 gray_count += 1
-            shapes[i] = np.array(img.shape[:2])
-        aspect = shapes[:, 1] / shapes[:, 0]
+            aspect = w / h
+            min_w, max_w, sum_w = min(min_w, w), max(max_w, w), sum_w + w
+            min_h, max_h, sum_h = min(min_h, h), max(max_h, h), sum_h + h
+            min_a, max_a = min(min_a, aspect), max(max_a, aspect)
+            sum_a += aspect
+    count = gray_count + rgb_count
     return {
         "gray_count": gray_count,
-        "gray_ratio": gray_count / (gray_count + rgb_count),
+        "gray_ratio": gray_count / count,
         "rgb_count": rgb_count,
-        "rgb_ratio": rgb_count / (gray_count + rgb_count),
-        "min_aspect": aspect.min(),
-        "mean_aspect": aspect.mean(),
-        "max_aspect": aspect.max(),
-        "min_width": shapes[:, 0].min(),
-        "mean_width": shapes[:, 0].mean(),
-        "max_width": shapes[:, 0].max(),
-        "min_height": shapes[:, 1].min(),
-        "mean_height": shapes[:, 1].mean(),
-        "max_height": shapes[:, 1].max(),
+        "rgb_ratio": rgb_count / count,
+        "min_aspect": min_a,
+        "mean_aspect": sum_a / count,
+        "max_aspect": max_a,
+        "min_width": min_w,
+        "mean_width": sum_w / count,
+        "max_width": max_w,
+        "min_height": min_h,
+        "mean_height": sum_h / count,
+        "max_height": max_h,
     }
 
 
 def get_summary(annotations: Annotations, labels: Labels) -> t.Any:
     count = len(annotations)
-    label_count = pipe(annotations, map(lambda x: len(x["label_ids"])), list, np.array)
+    label_count = np.fromiter(
+        (len(x["label_ids"]) for x in annotations), dtype=np.int32, count=count
+    )
+    hist = np.bincount(label_count, minlength=6)
     label_hist = {
-        5: np.sum(label_count == 5),
-        4: np.sum(label_count == 4),
-        3: np.sum(label_count == 3),
+        5: hist[5],
+        4: hist[4],
+        3: hist[3],
     }
 
-    label_ids = pipe(annotations, mapcat(lambda x: x["label_ids"]), list, np.array,)
-    total_label_count = len(label_ids)
-    top = pipe(
-        frequencies(label_ids).items(),
-        topk(5, key=lambda x: x[1]),
-        map(lambda x: (f"{labels[x[0]]['category']}::{labels[x[0]]['detail']}", x[1],)),
-        list,
-    )
-
-    worst = pipe(
-        frequencies(label_ids).items(),
-        topk(5, key=lambda x: -x[1]),
-        map(lambda x: (f"{labels[x[0]]['category']}::{labels[x[0]]['detail']}", x[1],)),
-        list,
+    label_ids = np.fromiter(
+        itertools.chain.from_iterable(x["label_ids"] for x in annotations),
+        dtype=np.int32,
     )
+    total_label_count = len(label_ids)
+    counts = np.bincount(label_ids, minlength=len(labels))
+
+    def to_named(ids: t.Any) -> t.List[t.Tuple[str, int]]:
+        return [
+            (f"{labels[i]['category']}::{labels[i]['detail']}", int(counts[i]))
+            for i in ids
+        ]
+
+    present = np.flatnonzero(counts)
+    ranked = present[np.argsort(counts[present], kind="stable")]
+    top = to_named(ranked[::-1][:5])
+    worst = to_named(ranked[:5])
     return {
         "count": count,
         "label_hist": label_hist,
@@ -121,29 +162,35 @@ def get_summary(annotations: Annotations, labels: Labels) -> t.Any:
 
 def kfold(
     n_splits: int, annotations: Annotations,
-) -> t.List[t.Tuple[Annotations, Annotations]]:
+) -> t.List[t.Tuple[t.Any, t.Any]]:
+    """returns (train, test) index arrays into annotations"""
     multi_hot = to_multi_hot(annotations, size=3474)
-    indecies = range(len(multi_hot))
+    indecies = np.arange(len(multi_hot))
     mskf = MultilabelStratifiedKFold(n_splits=n_splits, random_state=0)
-    return [
-        ([annotations[i] for i in test], [annotations[i] for i in test])
-        for train, test in mskf.split(indecies, multi_hot)
-    ]
+    return list(mskf.split(indecies, multi_hot))
 
 
 def to_multi_hot(annotations: Annotations, size: int = 3474) -> t.Any:
-    rows = np.zeros((len(annotations), size))
-    for i, ano in enumerate(annotations):
-        base = np.zeros(size)
-        for l in ano["label_ids"]:
-            base[l] = 1
-        rows[i] = base
+    row_idx = np.repeat(
+        np.arange(len(annotations)), [len(x["label_ids"]) for x in annotations]
+    )
+    col_idx = np.fromiter(
+        itertools.chain.from_iterable(x["label_ids"] for x in annotations),
+        dtype=np.int32,
+    )
+    rows = np.zeros((len(annotations), size), dtype=np.float32)
+    rows[row_idx, col_idx] = 1.0
     return rows
 
 
-def evaluate(pred: Annotations, gt: Annotations) -> float:
-    scores: t.List[float] = []
-    for p, g in zip(to_multi_hot(pred), to_multi_hot(gt)):
-        score = fbeta_score(g, p, beta=2)
-        scores.append(score)
-    return np.array(scores).mean()
+def evaluate(pred: Annotations, gt: Annotations, beta: float = 2) -> float:
+    p = to_multi_hot(pred).astype(bool)
+    g = to_multi_hot(gt).astype(bool)
+    tp = (p & g).sum(axis=1)
+    fp = (p & ~g).sum(axis=1)
+    fn = (~p & g).sum(axis=1)
+    beta2 = beta ** 2
+    num = (1 + beta2) * tp
+    den = num + beta2 * fn + fp
+    scores = np.divide(num, den, out=np.zeros(len(den)), where=den > 0)
+    return scores.mean()
@@ -2,7 +2,7 @@ import numpy as np
 import typing as t
 import os
 from .entities import Annotations
-from .dataset import Dataset
+from .dataset import Dataset, collate_fn
 import os
 import torch
 from torch import optim
@@ -12,6 +12,7 @@ from torch.utils.data import DataLoader
 from mlboard_client import Writer
 from datetime import datetime
 from .preprocess import evaluate
+from .models import SEResNeXt, freeze
 from logging import getLogger
 from tqdm import tqdm
 
@@ -92,26 +93,86 @@ DEVICE = torch.device("cuda")
 #      trainer.train(1000)
 #
 #
+def to_logits(output: torch.Tensor) -> torch.Tensor:
+    """(B, C, H, W) SEResNeXt features -> (B, C) per-label logits"""
+    return output.mean(dim=(2, 3))
+
+
 DataLoaders = t.TypedDict("DataLoaders", {"train": DataLoader, "test": DataLoader,})
 #
 #
 class Trainer:
     def __init__(
-        self, test_data: Annotations, train_data: Annotations, model_path: str
+        self,
+        test_data: Annotations,
+        train_data: Annotations,
+        model_path: str,
+        eval_interval: int = 10,
     ) -> None:
         self.device = DEVICE
-        #  self.model = UNet(in_channels=1, n_classes=11).to(DEVICE)
-        #  self.optimizer = optim.Adam(self.model.parameters())
-        self.objective = nn.CrossEntropyLoss()
+        torch.backends.cudnn.benchmark = True
+        self.resolution = 128
+        self.model = SEResNeXt(
+            in_channels=3, out_channels=3474, depth=3, width=128, stride=2,
+        ).to(self.device, memory_format=torch.channels_last)
+        self.train_model: t.Any = self.model
+        if hasattr(torch, "compile"):
+            self.train_model = torch.compile(
+                self.model, mode="max-autotune", dynamic=False
+            )
+        self.eval_model: t.Any = None
+        self.optimizer = optim.Adam(self.model.parameters())
+        self.scaler = torch.cuda.amp.GradScaler()
+        self.objective = nn.BCEWithLogitsLoss()
+        self.eval_interval = eval_interval
         self.epoch = 1
         self.model_path = model_path
+        loader_kwargs: t.Dict[str, t.Any] = dict(
+            batch_size=32,
+            num_workers=max(1, (os.cpu_count() or 2) // 2),
+            persistent_workers=True,
+            pin_memory=True,
+            prefetch_factor=4,
+            collate_fn=collate_fn,
+        )
         self.data_loaders: DataLoaders = {
-            "train": DataLoader(Dataset(train_data, resolution=128, pin_memory=True), shuffle=True, batch_size=32),
-            "test": DataLoader(Dataset(test_data, resolution=128, pin_memory=True), shuffle=False, batch_size=32),
+            "train": DataLoader(
+                Dataset(train_data, resolution=self.resolution),
+                shuffle=True,
+                **loader_kwargs,
+            ),
+            "test": DataLoader(
+                Dataset(test_data, resolution=self.resolution),
+                shuffle=False,
+                **loader_kwargs,
+            ),
         }
 
+    def to_device(self, img: t.Any, label: t.Any) -> t.Tuple[t.Any, t.Any]:
+        # copy the pinned uint8 NHWC batch first, then cast on the device
+        img = img.to(self.device, non_blocking=True)
+        img = img.permute(0, 3, 1, 2).float()
+        img = img.contiguous(memory_format=torch.channels_last)
+        label = label.to(self.device, non_blocking=True)
+        return img, label
+
+    def freeze_for_inference(self) -> None:
+        example = torch.zeros(
+            1, 3, self.resolution, self.resolution, device=self.device
+        ).to(memory_format=torch.channels_last)
+        self.eval_model = freeze(self.model, example)
+
+    def train_step(self, data: t.Tuple[t.Any, t.Any]) -> t.Any:
+        img, label = data
+        output = to_logits(self.train_model(img))
+        return self.objective(output, label)
+
     def eval_step(self, data: t.Tuple[t.Any, t.Any]) -> t.Tuple[t.Any, t.Any, t.Any]:
-        ...
+        img, label = data
+        with torch.no_grad():
+            output = to_logits(self.eval_model(img))
+        loss = self.objective(output, label)
+        return output, label, loss
         #  image, mask = data
         # tta
         #  output = (
@@ -124,24 +185,38 @@ class Trainer:
         #  return pred, mask, loss
 
     def train_one_epoch(self) -> None:
-        #  self.model.train()
+        self.train_model.train()
         epoch_loss = 0.0
         f1_score = 0.0
         for img, label, ano in tqdm(self.data_loaders["train"]):
-            img, label = img.to(self.device), label.to(self.device)
-            #  preds, truths, loss = self.train_step((img, msk))
-            #  loss.backward()
-            #  self.optimizer.step()
-            #  self.optimizer.zero_grad()
-            #  epoch_loss += loss.item()
+            img, label = self.to_device(img, label)
+            self.optimizer.zero_grad()
+            with torch.cuda.amp.autocast(dtype=torch.float16):
+                loss = self.train_step((img, label))
+            self.scaler.scale(loss).backward()
+            self.scaler.step(self.optimizer)
+            self.scaler.update()
+            epoch_loss += loss.item()
             #  f1_score += eval(
             #      preds.view(-1).cpu().numpy(), truths.view(-1).cpu().numpy()
             #  )
-        #  epoch_loss = epoch_loss / len(self.data_loaders["train"])
+        epoch_loss = epoch_loss / len(self.data_loaders["train"])
         #  f1_score = f1_score / len(self.data_loaders["train"])
-        #  logger.info(f"{epoch_loss=}, {f1_score=}")
+        logger.info(f"{epoch_loss=}")
+
+    def eval_one_epoch(self) -> None:
+        self.freeze_for_inference()
+        epoch_loss = 0.0
+        for img, label, ano in tqdm(self.data_loaders["test"]):
+            img, label = self.to_device(img, label)
+            _, _, loss = self.eval_step((img, label))
+            epoch_loss += loss.item()
+        epoch_loss = epoch_loss / len(self.data_loaders["test"])
+        logger.info(f"{epoch_loss=}")
 
     def train(self, max_epochs: int) -> None:
         for epoch in range(self.epoch, max_epochs + 1):
             self.epoch = epoch
             self.train_one_epoch()
+            if epoch % self.eval_interval == 0:
+                self.eval_one_epoch()
@@ -10,6 +10,7 @@ setup(
     packages=find_packages(),
     install_requires=[
         "pandas",
+        "pyarrow",
         "mlboard_client",
         "scikit-learn",
         "cytoolz",
@@ -22,6 +23,7 @@ setup(
         "tqdm",
         "typer",
         "scikit-image",
+        "pillow",
         "iterative-stratification",
     ],
     extras_require={"dev": ["mypy", "pytest", "black",]},
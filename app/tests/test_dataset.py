@@ -1,5 +1,6 @@
 import pytest
-from app.dataset import Dataset
+from app.dataset import Dataset, collate_fn
+import numpy as np
 from app.entities import Annotations
 import typing as t
 from app.cache import Cache
@@ -16,3 +17,14 @@ def test_dataset() -> None:
 
     d = Dataset(annotations)
     assert len(d) == 142119
+
+
+def test_collate_fn() -> None:
+    batch = [
+        (np.zeros((4, 4, 3), dtype=np.uint8), np.zeros(3), {"id": "a0", "label_ids": [1]}),
+        (np.ones((4, 4, 3), dtype=np.uint8), np.ones(3), {"id": "a1", "label_ids": [0, 2]}),
+    ]
+    img, label, rows = collate_fn(batch)  # type: ignore
+    assert img.shape == (2, 4, 4, 3)
+    assert label.shape == (2, 3)
+    assert [r["id"] for r in rows] == ["a0", "a1"]
@@ -1,4 +1,5 @@
-from app.models import SCSEModule, SEResNeXt
+from app.models import SCSEModule, SEResNeXt, ConvBR2d, SplitConvBR2d, freeze, fuse
+import torch.nn as nn
 import torch
 
 
@@ -8,6 +9,13 @@ def test_scse() -> None:
     y = layer(x)
     assert x.shape == y.shape
 
+
+def test_scse_matches_branches() -> None:
+    x = torch.randn(2, 32, 8, 8)
+    layer = SCSEModule(in_channels=32, reduction=4,)
+    with torch.no_grad():
+        assert torch.allclose(layer(x), layer.c_se(x) + layer.s_se(x), atol=1e-6)
+
 def test_seresnext() -> None:
     x = torch.randn(16, 3, 128, 128)
     layer = SEResNeXt(
@@ -16,6 +24,67 @@ def test_seresnext() -> None:
         depth=2,
         width=1024,
     )
-    print(layer)
     y = layer(x)
-    #  assert x.shape == y.shape
+    assert y.shape == (16, 3474, 128, 128)
+
+
+def test_seresnext_stride() -> None:
+    x = torch.randn(2, 3, 32, 32)
+    layer = SEResNeXt(in_channels=3, out_channels=64, depth=2, width=32, stride=2,)
+    y = layer(x)
+    assert y.shape == (2, 64, 8, 8)
+
+
+def test_freeze() -> None:
+    x = torch.randn(2, 3, 32, 32)
+    layer = SEResNeXt(in_channels=3, out_channels=64, depth=2, width=32,).eval()
+    frozen = freeze(layer, x)
+    with torch.no_grad():
+        assert torch.allclose(layer(x), frozen(x), atol=1e-4)
+
+
+def randomize_bn(model: nn.Module) -> None:
+    for m in model.modules():
+        if isinstance(m, nn.BatchNorm2d):
+            m.running_mean.uniform_(-1, 1)
+            m.running_var.uniform_(0.5, 2)
+            nn.init.uniform_(m.weight, -1, 1)
+            nn.init.uniform_(m.bias, -1, 1)
+
+
+def test_convbr2d_fuse() -> None:
+    x = torch.randn(4, 8, 16, 16)
+    layer = ConvBR2d(8, 16, 3, 1).eval()
+    randomize_bn(layer)
+    with torch.no_grad():
+        y = layer(x)
+        layer.fuse()
+        assert isinstance(layer.bn, nn.Identity)
+        assert torch.allclose(y, layer(x), atol=1e-5)
+
+
+def test_fuse_nested() -> None:
+    x = torch.randn(4, 32, 16, 16)
+    layer = SplitConvBR2d(32, 32, 3, 1, groups=4).eval()
+    randomize_bn(layer)
+    with torch.no_grad():
+        y = layer(x)
+        fuse(layer)
+        assert all(isinstance(c.bn, nn.Identity) for c in layer.convs)
+        assert torch.allclose(y, layer(x), atol=1e-5)
+
+
+def test_split_convbr2d() -> None:
+    x = torch.randn(4, 32, 16, 16)
+    grouped = ConvBR2d(32, 32, 3, 1, groups=4).eval()
+    randomize_bn(grouped)
+    layer = SplitConvBR2d(32, 32, 3, 1, groups=4).eval()
+    with torch.no_grad():
+        for i, c in enumerate(layer.convs):
+            sl = slice(i * 8, (i + 1) * 8)
+            c.conv.weight.copy_(grouped.conv.weight[sl])
+            c.bn.weight.copy_(grouped.bn.weight[sl])
+            c.bn.bias.copy_(grouped.bn.bias[sl])
+            c.bn.running_mean.copy_(grouped.bn.running_mean[sl])
+            c.bn.running_var.copy_(grouped.bn.running_var[sl])
+        assert torch.allclose(grouped(x), layer(x), atol=1e-5)
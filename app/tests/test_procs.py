@@ -1,14 +1,19 @@
 import typing as t
+import os
+import pytest
 from app.preprocess import (
     load_labels,
     encode_attribute,
     get_summary,
+    get_images_summary,
     get_annotations,
+    get_annotations_cached,
     to_multi_hot,
     evaluate,
 )
 import numpy as np
 import pandas as pd
+from PIL import Image
 from app.cache import Cache
 from app.entities import Annotations
 
@@ -50,3 +55,85 @@ def test_evaluate() -> None:
     ]
     res = evaluate(pred_annotations, gt_annotations)
     assert res == 5 / 9
+
+
+def test_get_summary() -> None:
+    labels = {
+        i: {"id": i, "category": "tags", "detail": str(i)} for i in range(8)
+    }
+    annotations: Annotations = [
+        {"id": "a0", "label_ids": [0, 1, 2]},
+        {"id": "a1", "label_ids": [0, 1, 3]},
+        {"id": "a2", "label_ids": [0, 4, 5, 6]},
+    ]
+    res = get_summary(annotations, labels)  # type: ignore
+    assert res["label_hist"] == {5: 0, 4: 1, 3: 2}
+    assert res["total_label_count"] == 10
+    assert res["top"][:2] == [("tags::0", 3), ("tags::1", 2)]
+    assert len(res["worst"]) == 5
+    assert all(c == 1 for _, c in res["worst"])
+
+
+def test_get_annotations_cached(tmp_path: t.Any) -> None:
+    csv_path = tmp_path / "train.csv"
+    csv_path.write_text("id,attribute_ids\na0,1\na1,0 2\n")
+    cache_path = str(tmp_path / "train.parquet")
+    res = get_annotations_cached(str(csv_path), cache_path)
+    assert os.path.exists(cache_path)
+    assert [x["id"] for x in res] == ["a0", "a1"]
+    assert list(res[1]["label_ids"]) == [0, 2]
+
+    # older csv: served from the parquet file
+    cached_at = os.path.getmtime(cache_path)
+    csv_path.write_text("id,attribute_ids\nb0,3\n")
+    os.utime(csv_path, (cached_at - 10, cached_at - 10))
+    res = get_annotations_cached(str(csv_path), cache_path)
+    assert [x["id"] for x in res] == ["a0", "a1"]
+
+    # newer csv: rebuilt
+    os.utime(csv_path, (cached_at + 10, cached_at + 10))
+    res = get_annotations_cached(str(csv_path), cache_path)
+    assert [x["id"] for x in res] == ["b0"]
+    assert list(res[0]["label_ids"]) == [3]
+
+
+def write_pngs(image_dir: t.Any) -> None:
+    # (mode, width, height)
+    specs = [
+        ("L", 10, 20),
+        ("LA", 20, 10),
+        ("RGB", 30, 10),
+        ("RGBA", 10, 10),
+        ("P", 40, 20),
+        ("P", 20, 20),
+    ]
+    for i, (mode, w, h) in enumerate(specs):
+        im = Image.new(mode, (w, h))
+        if mode == "P":
+            gray = i == 5
+            im.putpalette([0, 0, 0, 128, 128, 128] if gray else [255, 0, 0, 0, 0, 255])
+        im.save(image_dir / f"{i}.png")
+
+
+def test_get_images_summary(tmp_path: t.Any) -> None:
+    write_pngs(tmp_path)
+    res = get_images_summary(str(tmp_path))
+    assert res["gray_count"] == 2
+    assert res["rgb_count"] == 4
+    assert (res["min_width"], res["max_width"]) == (10, 40)
+    assert res["mean_width"] == pytest.approx(130 / 6)
+    assert (res["min_height"], res["max_height"]) == (10, 20)
+    assert res["mean_height"] == pytest.approx(15)
+    assert (res["min_aspect"], res["max_aspect"]) == (0.5, 3)
+    assert res["mean_aspect"] == pytest.approx(9.5 / 6)
+
+
+def test_get_annotations_array_label_ids(tmp_path: t.Any) -> None:
+    csv_path = tmp_path / "train.csv"
+    csv_path.write_text("id,attribute_ids\na0,1\na1,0 2\n")
+    res = get_annotations(str(csv_path), {})
+    assert isinstance(res[1]["label_ids"], np.ndarray)
+    assert res[1]["label_ids"].dtype == np.int32
+    assert list(res[1]["label_ids"]) == [0, 2]
+    multi_hot = to_multi_hot(res, size=3)
+    assert (multi_hot != np.array([[0, 1, 0], [1, 0, 1]])).sum() == 0
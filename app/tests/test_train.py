@@ -0,0 +1,18 @@
+import torch
+from torch import nn
+from app.models import SEResNeXt
+from app.train import to_logits
+
+
+def test_multilabel_objective() -> None:
+    x = torch.randn(2, 3, 32, 32)
+    model = SEResNeXt(in_channels=3, out_channels=64, depth=2, width=32, stride=2,)
+    label = torch.zeros(2, 64)
+    label[0, [1, 3]] = 1
+    label[1, 0] = 1
+    output = to_logits(model(x))
+    assert output.shape == label.shape
+    loss = nn.BCEWithLogitsLoss()(output, label)
+    loss.backward()
+    assert torch.isfinite(loss)
+    assert model.in_conv.conv.weight.grad is not None